@@ -1,38 +1,65 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import os
 import warnings
-import json
-import base64
-from io import BytesIO
-from datetime import datetime, timedelta
+from html import escape
+from io import StringIO
+from datetime import datetime
+from zoneinfo import ZoneInfo
 
+import aiohttp
 import numpy as np
+import orjson
 import pandas as pd
-import matplotlib.pyplot as plt
-from pandas_datareader import data as web
+
+from macro_common import FRED_CSV_URL, downsample, fetch_window, load_cached, merge_tail, save_cached
 
 # Configuration
-# Use naive datetime for data fetching (pandas_datareader requirement)
+# Naive local datetimes: they bound the CSV request windows and YEAR_TICKS
 END = datetime.now()
 START = datetime(2018, 1, 1)
 
-# Calculate ET time for display only
-utc_offset = -5  # EST
-if 3 <= END.month <= 11:  # Rough DST calculation (March-November)
-    utc_offset = -4  # EDT
-END_ET = END + timedelta(hours=utc_offset)
+# ET time for display only (the naive END is local time; tzdata handles DST)
+END_ET = END.astimezone(ZoneInfo("America/New_York"))
 
 OUT_HTML = "index.html"
 OUT_JSON = "data.json"
 
+# Raw CSV endpoints (fetched concurrently, bypassing pandas_datareader)
+STOOQ_CSV_URL = "https://stooq.com/q/d/l/?s={code}&d1={start:%Y%m%d}&d2={end:%Y%m%d}&i=d"
+MAX_CONCURRENT_FETCHES = 8
+FETCH_TIMEOUT = 30  # seconds per request
+FETCH_RETRIES = 3  # extra attempts on timeouts, 429s and 5xx responses
+FETCH_BACKOFF = 1.0  # seconds before the first retry, doubled each time
+
+# Chart geometry (px), matching the old 5x2in @ 100dpi matplotlib figures
+CHART_W, CHART_H = 500, 200
+PAD_L, PAD_R, PAD_T, PAD_B = 44, 52, 24, 20
+PLOT_W, PLOT_H = CHART_W - PAD_L - PAD_R, CHART_H - PAD_T - PAD_B
+PLOT_BOTTOM = PAD_T + PLOT_H
+LINE_COLOR = "#1e40af"
+CHART_POINTS = 400  # max vertices per line, about one per horizontal pixel
+
+# Jan 1 of every year in the report window (int64 ns) for the x-axis grid
+YEAR_TICKS = (
+    np.arange(np.datetime64(f"{START.year}", "Y"), np.datetime64(f"{END.year + 1}", "Y"))
+    .astype("datetime64[ns]").view(np.int64)
+)
+YEAR_LABELS = [str(year) for year in range(START.year, END.year + 1)]
+
+# Return horizons: YTD (from YEAR_TICKS) plus fixed look-backs from each series' last date
+HORIZON_KEYS = ("YTD", "1M", "3M", "1Y", "3Y", "5Y")
+HORIZON_OFFSETS = np.array([30, 90, 365, 3*365, 5*365], dtype="timedelta64[D]").astype("timedelta64[ns]").view(np.int64)
+
 # Treat these as point changes (not percent)
-YIELD_OR_SPREAD = {
+YIELD_OR_SPREAD = frozenset({
     "DFF","FEDFUNDS","TB3MS","DGS3MO","DGS2","DGS5","DGS10","DGS30",
     "GS2","GS5","GS10","GS30",
     "AAA","BAA","BAMLH0A0HYM2","BAMLC0A0CMEY","BAMLC0A4CBBBEY",
     "MORTGAGE30US"
-}
+})
 
 SECTIONS = (
     ("Major Indices", {
@@ -81,151 +108,296 @@ SECTIONS = (
     }),
 )
 
+# Per-identifier diff-mode flag (yields/spreads use point changes), in first-seen order
+IS_DIFF = {ident: ident.split(":", 1)[1] in YIELD_OR_SPREAD for _, items in SECTIONS for ident in items}
+
 # Helper functions
-def fetch_series(ident, start=START, end=END):
-    """Fetch a single series from FRED or Stooq."""
-    src, code = ident.split(":", 1)
-    try:
-        if src == "FRED":
-            df = web.DataReader(code, "fred", start, end)
-            s = df.iloc[:,0]
-        elif src == "STQ":
-            df = web.DataReader(code, "stooq", start, end)
-            s = df["Close"].sort_index()
-        else:
-            return pd.Series(dtype=float)
-        
-        s = s.loc[(s.index >= start) & (s.index <= end)].dropna()
-        if not s.empty:
-            s = s.ffill()
-        return s
-    except Exception as e:
-        warnings.warn(f"Fetch failed for {ident}: {e}")
+async def download_series(session, src, code, start, end):
+    """Download one series as raw CSV from FRED or Stooq."""
+    if src == "FRED":
+        url = FRED_CSV_URL.format(code=code, start=start, end=end)
+    elif src == "STQ":
+        # Stooq lists US tickers with a country suffix (e.g. SPY.US)
+        url = STOOQ_CSV_URL.format(code=code if "." in code else f"{code}.US", start=start, end=end)
+    else:
         return pd.Series(dtype=float)
 
-def pct_return(a, b):
-    try:
-        if pd.isna(a) or pd.isna(b) or b == 0:
-            return np.nan
-        return (a/b - 1.0) * 100.0
-    except:
-        return np.nan
-
-def diff_return(a, b):
-    try:
-        if pd.isna(a) or pd.isna(b):
-            return np.nan
-        return a - b
-    except:
-        return np.nan
-
-def compute_returns(s, end_date, diff_mode):
-    horizons = {
-        "YTD": datetime(end_date.year, 1, 1),
-        "1M": end_date - timedelta(days=30),
-        "3M": end_date - timedelta(days=90),
-        "1Y": end_date - timedelta(days=365),
-        "3Y": end_date - timedelta(days=3*365),
-        "5Y": end_date - timedelta(days=5*365),
-    }
-    
-    out = {}
-    for k, t0 in horizons.items():
-        mask = s.index <= t0
-        if mask.any():
-            s0 = s.loc[mask].iloc[-1]
-        else:
-            s0 = np.nan
-        
-        s1 = s.iloc[-1] if not s.empty else np.nan
-        out[k] = diff_return(s1, s0) if diff_mode else pct_return(s1, s0)
-    
-    return out
-
-def normalized_100(s):
-    if s.empty: 
-        return s
-    base = s.iloc[0]
-    if base == 0 or pd.isna(base):
-        return pd.Series(index=s.index, dtype=float)
-    return (s / base) * 100.0
-
-def create_chart(s, title, is_normalized=False, is_yield=False):
-    """Create a chart similar to the PDF style."""
-    if s.empty or s.isna().all():
-        return ""
-    
-    fig, ax = plt.subplots(figsize=(5, 2), dpi=100)
-    
-    if is_normalized:
-        s_plot = normalized_100(s)
-        title_suffix = " - Normalized (2018=100)"
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                text = await resp.text()
+            break
+        except aiohttp.ClientResponseError as e:
+            if (e.status < 500 and e.status != 429) or attempt == FETCH_RETRIES:
+                raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == FETCH_RETRIES:
+                raise
+        await asyncio.sleep(FETCH_BACKOFF * 2 ** attempt)
+
+    df = pd.read_csv(StringIO(text), index_col=0, parse_dates=True, na_values=".")
+    if src == "FRED":
+        return df.iloc[:,0]
+    s = df["Close"]
+    return s if s.index.is_monotonic_increasing else s.sort_index()  # usually oldest-first already
+
+async def fetch_series_async(ident, session, start=START, end=END):
+    """Fetch a single series, downloading only what the disk cache is missing."""
+    src, code = ident.split(":", 1)
+    cached = load_cached(ident)
+    window = fetch_window(ident, cached, start)
+
+    if window is None:
+        s = cached  # written moments ago, skip the network entirely
     else:
-        s_plot = s
-        title_suffix = f" - {'Yield (%)' if is_yield else 'Level'}"
-    
-    # Plot with style similar to PDF
-    ax.plot(s_plot.index, s_plot.values, linewidth=1, color='#1e40af')
-    ax.fill_between(s_plot.index, s_plot.values, alpha=0.1, color='#1e40af')
-    
-    # Add grid
-    ax.grid(True, alpha=0.3, linewidth=0.5)
+        fetch_start, incremental = window
+        try:
+            s = await download_series(session, src, code, fetch_start, end)
+            s = s.dropna()
+            if incremental:
+                s = merge_tail(cached, s)
+            if not s.empty:
+                save_cached(ident, s)
+        except Exception as e:
+            warnings.warn(f"Fetch failed for {ident}: {e}")
+            s = cached  # fall back to stale data rather than nothing
+
+    # Already NaN-free (dropped before caching); just trim to the requested window
+    return s.loc[start:end]
+
+async def fetch_all(idents):
+    """Fetch every series concurrently over one shared HTTP session."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_FETCHES)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def fetch_one(ident):
+            async with semaphore:
+                return await fetch_series_async(ident, session)
+
+        results = await asyncio.gather(*[fetch_one(i) for i in idents])
+
+    return dict(zip(idents, results))
+
+def series_arrays(s):
+    """Snapshot a series as (int64 ns timestamps, float values) for the hot paths."""
+    return s.index.values.astype("datetime64[ns]").view(np.int64), s.to_numpy(dtype=float)
+
+def compute_returns(x, y, diff_mode):
+    if len(y) == 0:
+        return dict.fromkeys(HORIZON_KEYS, np.nan)
     
-    # Style the plot
-    ax.set_title(f"{title}{title_suffix}", fontsize=9, pad=5)
-    ax.tick_params(labelsize=7)
+    # Last observation on or before each horizon: one binary search on the sorted timestamps
+    end = x[-1]
+    ytd = YEAR_TICKS[np.searchsorted(YEAR_TICKS, end, side="right") - 1]
+    targets = np.concatenate(([ytd], end - HORIZON_OFFSETS))
+    positions = np.searchsorted(x, targets, side="right") - 1
+    s0 = np.where(positions >= 0, y[positions], np.nan)
+    s1 = y[-1]
     
-    # Format x-axis to show years
-    years = pd.date_range(start=s_plot.index[0], end=s_plot.index[-1], freq='YS')
-    ax.set_xticks(years)
-    ax.set_xticklabels([d.strftime('%Y') for d in years], fontsize=7)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if diff_mode:
+            result = s1 - s0
+        else:
+            result = np.where(s0 == 0, np.nan, (s1 / s0 - 1.0) * 100.0)
     
+    return dict(zip(HORIZON_KEYS, result.tolist()))
+
+POSITIVE_SPAN = '<span class="positive">'
+NEGATIVE_SPAN = '<span class="negative">'
+
+def format_val(val, is_diff=False):
+    """Format a return cell, colouring positive/negative values."""
+    if val != val:  # NaN
+        return ""
+    if val > 0:
+        return f'{POSITIVE_SPAN}{val:.2f}</span>'
+    if val < 0:
+        return f'{NEGATIVE_SPAN}{val:.2f}</span>'
+    return f'{val:.2f}'
+
+def nice_ticks(lo, hi, n=4):
+    """Round tick positions (1/2/5 x 10^k steps) spanning roughly [lo, hi]."""
+    span = hi - lo
+    if not np.isfinite(span) or span <= 0:
+        return np.array([lo])
+    raw = span / n
+    mag = 10 ** np.floor(np.log10(raw))
+    step = next(m * mag for m in (1, 2, 5, 10) if m * mag >= raw)
+    return np.arange(np.ceil(lo / step) * step, hi + step * 1e-9, step) + 0.0  # no "-0" labels
+
+def create_chart_pair(x, y, title, is_yield=False):
+    """Create the normalized and level charts for one series as inline SVG markup.
+
+    Both charts share the same x-axis, so the downsampling, x positions and
+    year grid are computed once and reused.
+    """
+    if len(y) == 0:
+        return "", ""
+
+    first_tick = np.searchsorted(YEAR_TICKS, x[0], side="left")
+    last_tick = np.searchsorted(YEAR_TICKS, x[-1], side="right")
+    x, y = downsample(x.astype(float), y, CHART_POINTS)
+    x0, x1 = x[0], x[-1]
+    px = PAD_L + (x - x0) / ((x1 - x0) or 1.0) * PLOT_W
+
+    # Vertical grid + year labels
+    x_grid = []
+    for tick, year in zip(YEAR_TICKS[first_tick:last_tick], YEAR_LABELS[first_tick:last_tick]):
+        tx = PAD_L + (tick - x0) / ((x1 - x0) or 1.0) * PLOT_W
+        x_grid.append(f'<line x1="{tx:.1f}" y1="{PAD_T}" x2="{tx:.1f}" y2="{PLOT_BOTTOM}" stroke="#b0b0b0" stroke-opacity="0.3" stroke-width="0.5"/>')
+        x_grid.append(f'<text x="{tx:.1f}" y="{PLOT_BOTTOM + 12}" font-size="9" text-anchor="middle">{year}</text>')
+    x_grid = "".join(x_grid)
+
+    base = y[0]
+    norm_chart = "" if base == 0 else create_chart_svg(px, y / base * 100.0, f"{title} - Normalized (2018=100)", x_grid)
+    level_chart = create_chart_svg(px, y, f"{title} - {'Yield (%)' if is_yield else 'Level'}", x_grid)
+    return norm_chart, level_chart
+
+def create_chart_svg(px, y, title, x_grid):
+    """Draw one chart similar to the PDF style, given its x positions and year grid."""
+    # Area is filled down to zero (like fill_between), so keep zero in range
+    lo, hi = min(y.min(), 0.0), max(y.max(), 0.0)
+    pad = (hi - lo) * 0.05 or 1.0
+    lo, hi = lo - pad, hi + pad
+
+    py = PAD_T + (hi - y) / (hi - lo) * PLOT_H
+    zero_y = PAD_T + hi / (hi - lo) * PLOT_H
+
+    heading = escape(title)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{CHART_W}" height="{CHART_H}" '
+        f'viewBox="0 0 {CHART_W} {CHART_H}" font-family="Arial, Helvetica, sans-serif" '
+        f'role="img" aria-label="{heading}">',
+        f'<rect width="{CHART_W}" height="{CHART_H}" fill="white"/>',
+        f'<text x="{CHART_W / 2}" y="15" font-size="12" text-anchor="middle">{heading}</text>',
+    ]
+
+    # Horizontal grid + y labels
+    for tick in nice_ticks(lo, hi):
+        ty = PAD_T + (hi - tick) / (hi - lo) * PLOT_H
+        parts.append(f'<line x1="{PAD_L}" y1="{ty:.1f}" x2="{PAD_L + PLOT_W}" y2="{ty:.1f}" stroke="#b0b0b0" stroke-opacity="0.3" stroke-width="0.5"/>')
+        parts.append(f'<text x="{PAD_L - 4}" y="{ty + 3:.1f}" font-size="9" text-anchor="end">{tick:g}</text>')
+
+    parts.append(x_grid)
+
+    # Left and bottom spines only
+    parts.append(f'<path d="M{PAD_L},{PAD_T}V{PLOT_BOTTOM}H{PAD_L + PLOT_W}" fill="none" stroke="black" stroke-width="0.8"/>')
+
+    # Filled area + line
+    pts = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(px, py))
+    parts.append(f'<polygon points="{px[0]:.1f},{zero_y:.1f} {pts} {px[-1]:.1f},{zero_y:.1f}" fill="{LINE_COLOR}" fill-opacity="0.1"/>')
+    parts.append(f'<polyline points="{pts}" fill="none" stroke="{LINE_COLOR}" stroke-width="1.3"/>')
+
     # Add min/max markers
-    if len(s_plot) > 0:
-        max_idx = s_plot.idxmax()
-        min_idx = s_plot.idxmin()
-        ax.plot(max_idx, s_plot[max_idx], '^', markersize=5, color='#16a34a')
-        ax.plot(min_idx, s_plot[min_idx], 'v', markersize=5, color='#dc2626')
-        
-        # Add current value annotation
-        current_val = s_plot.iloc[-1]
-        ax.annotate(f'{current_val:.1f}', 
-                   xy=(s_plot.index[-1], current_val),
-                   xytext=(5, 0), 
-                   textcoords='offset points',
-                   fontsize=7,
-                   bbox=dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.3))
-    
-    # Remove top and right spines
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    
-    plt.tight_layout()
-    
-    # Convert to base64
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight', transparent=False, facecolor='white')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.read()).decode()
-    plt.close(fig)
-    
-    return f"data:image/png;base64,{image_base64}"
+    i_max, i_min = int(y.argmax()), int(y.argmin())
+    mx, my = px[i_max], py[i_max]
+    parts.append(f'<path d="M{mx:.1f},{my - 4:.1f}l4,7h-8z" fill="#16a34a"/>')
+    mx, my = px[i_min], py[i_min]
+    parts.append(f'<path d="M{mx:.1f},{my + 4:.1f}l4,-7h-8z" fill="#dc2626"/>')
+
+    # Add current value annotation
+    label = f"{y[-1]:.1f}"
+    lx, ly = px[-1] + 5, py[-1]
+    parts.append(f'<rect x="{lx:.1f}" y="{ly - 7:.1f}" width="{len(label) * 5.5 + 6:.1f}" height="14" rx="3" fill="yellow" fill-opacity="0.3"/>')
+    parts.append(f'<text x="{lx + 3:.1f}" y="{ly + 3:.1f}" font-size="9">{label}</text>')
+    parts.append('</svg>')
+
+    return "".join(parts)
+
+# Per-section HTML fragments, filled in with str.format
+SECTION_HEAD = """
+    <div class="section">
+        <div class="section-title">{title}</div>
+        <table>
+            <thead>
+                <tr>
+                    <th style="width: 25%">Series</th>
+                    <th style="width: 12.5%">Current</th>
+                    <th style="width: 10.5%">YTD</th>
+                    <th style="width: 10.5%">1M</th>
+                    <th style="width: 10.5%">3M</th>
+                    <th style="width: 10.5%">1Y</th>
+                    <th style="width: 10.5%">3Y</th>
+                    <th style="width: 10.5%">5Y</th>
+                </tr>
+            </thead>
+            <tbody>
+"""
+
+NO_DATA_ROW = """
+                <tr>
+                    <td>{name}</td>
+                    <td colspan="7" style="text-align: center; color: #999;">No data</td>
+                </tr>
+"""
+
+DATA_ROW = """
+                <tr>
+                    <td>{name}</td>
+                    <td class="current-value">{current:.2f}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                </tr>
+"""
+
+# Closes the table and opens the charts grid
+SECTION_TABLE_END = """
+            </tbody>
+        </table>
+
+        <div class="charts-container">
+"""
+
+CHART_PAIR = """
+            <div class="chart-pair">
+                <div class="chart-wrapper">
+                    {norm}
+                </div>
+                <div class="chart-wrapper">
+                    {level}
+                </div>
+            </div>
+"""
+
+SECTION_FOOT = """
+        </div>
+    </div>
+"""
 
 def generate_html_report():
     """Generate the HTML dashboard that looks like the PDF."""
     print(f"Generating HTML Dashboard...")
     print(f"Fetching data from {START.strftime('%Y-%m-%d')} to {END.strftime('%Y-%m-%d')}")
     
-    # Fetch all data
-    data = {}
-    for section, items in SECTIONS:
-        for ident in items.keys():
-            if ident not in data:
-                print(f"  Fetching {ident}...")
-                data[ident] = fetch_series(ident)
+    # Fetch all data concurrently (each identifier once, even if shared by sections)
+    idents = list(IS_DIFF)
+    print(f"  Fetching {len(idents)} series...")
+    data = asyncio.run(fetch_all(idents))
+    for ident, s in data.items():
+        print(f"  {ident:<22} {'✓' if not s.empty else '✗ Failed'}")
     
-    # Generate HTML that looks like the PDF
-    html = """<!DOCTYPE html>
+    # Snapshot each series as arrays once, then compute its returns once;
+    # both are reused by the HTML table, the charts and the JSON dump
+    arrays = {ident: series_arrays(s) for ident, s in data.items() if not s.empty}
+    returns_cache = {}
+    for ident, (x, y) in arrays.items():
+        end_date = pd.Timestamp(x[-1])
+        returns_cache[ident] = (compute_returns(x, y, IS_DIFF[ident]), y[-1], end_date)
+    
+    # Stream the HTML to a temp file as it is generated, then swap it in so the
+    # published page is never seen half-written
+    tmp_html = OUT_HTML + ".tmp"
+    with open(tmp_html, 'w', encoding='utf-8', buffering=1 << 20) as html_file:
+        write = html_file.write
+        write("""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -349,7 +521,7 @@ def generate_html_report():
             text-align: center;
         }
         
-        .chart-wrapper img {
+        .chart-wrapper svg {
             width: 100%;
             max-width: 350px;
             height: auto;
@@ -456,111 +628,48 @@ def generate_html_report():
         <h1>MACRO MONITOR</h1>
         <div class="timestamp">Data as of: """ + END_ET.strftime('%B %d, %Y at %I:%M %p') + """ ET</div>
     </div>
-"""
-    
-    # Generate sections with prominent charts like the PDF
-    for section_name, items in SECTIONS:
-        html += f"""
-    <div class="section">
-        <div class="section-title">{section_name}</div>
-        <table>
-            <thead>
-                <tr>
-                    <th style="width: 25%">Series</th>
-                    <th style="width: 12.5%">Current</th>
-                    <th style="width: 10.5%">YTD</th>
-                    <th style="width: 10.5%">1M</th>
-                    <th style="width: 10.5%">3M</th>
-                    <th style="width: 10.5%">1Y</th>
-                    <th style="width: 10.5%">3Y</th>
-                    <th style="width: 10.5%">5Y</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
+""")
         
-        # First pass: generate table rows
-        for ident, name in items.items():
-            s = data.get(ident, pd.Series(dtype=float))
-            
-            if s.empty:
-                html += f"""
-                <tr>
-                    <td>{name}</td>
-                    <td colspan="7" style="text-align: center; color: #999;">No data</td>
-                </tr>
-"""
-                continue
-            
-            # Calculate returns
-            code = ident.split(":")[1]
-            diff_mode = code in YIELD_OR_SPREAD
-            end_date = s.index[-1]
-            ret = compute_returns(s, end_date, diff_mode)
-            current_val = s.iloc[-1]
-            
-            # Format values
-            def format_val(val, is_diff=False):
-                if pd.isna(val):
-                    return ""
-                if val > 0:
-                    return f'<span class="positive">{val:.2f}</span>'
-                elif val < 0:
-                    return f'<span class="negative">{val:.2f}</span>'
-                else:
-                    return f'{val:.2f}'
-            
-            html += f"""
-                <tr>
-                    <td>{name}</td>
-                    <td class="current-value">{current_val:.2f}</td>
-                    <td>{format_val(ret['YTD'], diff_mode)}</td>
-                    <td>{format_val(ret['1M'], diff_mode)}</td>
-                    <td>{format_val(ret['3M'], diff_mode)}</td>
-                    <td>{format_val(ret['1Y'], diff_mode)}</td>
-                    <td>{format_val(ret['3Y'], diff_mode)}</td>
-                    <td>{format_val(ret['5Y'], diff_mode)}</td>
-                </tr>
-"""
-        
-        html += """
-            </tbody>
-        </table>
-"""
-        
-        # Second pass: generate charts grid
-        html += """
-        <div class="charts-container">
-"""
+        # JSON is accumulated alongside the table rows
+        json_data = {
+            "updated": END,
+            "sections": {}
+        }
         
-        for ident, name in items.items():
-            s = data.get(ident, pd.Series(dtype=float))
+        # Generate sections with prominent charts like the PDF
+        for section_name, items in SECTIONS:
+            json_section = json_data["sections"][section_name] = {}
+            write(SECTION_HEAD.format(title=section_name))
             
-            if not s.empty:
-                code = ident.split(":")[1]
-                is_yield = code in YIELD_OR_SPREAD
+            # First pass: generate table rows
+            for ident, name in items.items():
+                if ident not in returns_cache:
+                    write(NO_DATA_ROW.format(name=name))
+                    continue
                 
-                # Generate both charts
-                level_chart = create_chart(s, name, False, is_yield)
-                norm_chart = create_chart(s, name, True, is_yield)
+                ret, current_val, end_date = returns_cache[ident]
+                json_section[name] = {
+                    "current": current_val,
+                    "returns": ret,  # orjson writes NaN as null
+                    "last_date": end_date.isoformat()
+                }
                 
-                html += f"""
-            <div class="chart-pair">
-                <div class="chart-wrapper">
-                    <img src="{norm_chart}" alt="{name} Normalized">
-                </div>
-                <div class="chart-wrapper">
-                    <img src="{level_chart}" alt="{name} Level">
-                </div>
-            </div>
-"""
+                write(DATA_ROW.format(*[format_val(v, IS_DIFF[ident]) for v in ret.values()], name=name, current=current_val))
+            
+            # Second pass: generate charts grid
+            write(SECTION_TABLE_END)
+            
+            for ident, name in items.items():
+                if ident in arrays:
+                    x, y = arrays[ident]
+                    
+                    # Generate both charts
+                    norm_chart, level_chart = create_chart_pair(x, y, name, IS_DIFF[ident])
+                    write(CHART_PAIR.format(norm=norm_chart, level=level_chart))
+            
+            write(SECTION_FOOT)
         
-        html += """
-        </div>
-    </div>
-"""
-    
-    html += """
+        write("""
     <div class="footer">
         <p>Data sources: FRED (Federal Reserve Economic Data) & Stooq</p>
         <p>Note: FRED data may have 1-2 day lag | Updates 5x daily during market hours</p>
@@ -587,36 +696,13 @@ def generate_html_report():
     </script>
 </body>
 </html>
-"""
+""")
     
-    # Save HTML
-    with open(OUT_HTML, 'w') as f:
-        f.write(html)
+    os.replace(tmp_html, OUT_HTML)
     
     # Save data as JSON
-    json_data = {
-        "updated": END.isoformat(),
-        "sections": {}
-    }
-    
-    for section_name, items in SECTIONS:
-        json_data["sections"][section_name] = {}
-        for ident, name in items.items():
-            s = data.get(ident, pd.Series(dtype=float))
-            if not s.empty:
-                code = ident.split(":")[1]
-                diff_mode = code in YIELD_OR_SPREAD
-                end_date = s.index[-1]
-                ret = compute_returns(s, end_date, diff_mode)
-                
-                json_data["sections"][section_name][name] = {
-                    "current": float(s.iloc[-1]),
-                    "returns": {k: float(v) if not pd.isna(v) else None for k, v in ret.items()},
-                    "last_date": end_date.isoformat()
-                }
-    
-    with open(OUT_JSON, 'w') as f:
-        json.dump(json_data, f, indent=2)
+    with open(OUT_JSON, 'wb') as f:
+        f.write(orjson.dumps(json_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     print(f"✅ Generated {OUT_HTML}")
     print(f"✅ Generated {OUT_JSON}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pieces shared by macro_report_full.py and generate_html.py.
+
+Both scripts read and write the same on-disk series cache, so its layout
+and freshness rules live here and nowhere else.
+"""
+
+import os
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# FRED's raw CSV endpoint
+FRED_CSV_URL = "https://fred.stlouisfed.org/graph/fredgraph.csv?id={code}&cosd={start:%Y-%m-%d}&coed={end:%Y-%m-%d}"
+
+# On-disk series cache: only the tail since the last cached date is re-downloaded
+CACHE_DIR = Path(".series_cache")
+CACHE_OVERLAP = timedelta(days=5)  # re-fetch a few days to pick up late revisions
+CACHE_TTL = timedelta(minutes=30)  # younger cache files are used without any request
+CACHE_MAX_AGE = timedelta(hours=24)  # older cache files trigger a full re-download
+
+def cache_path(ident: str) -> Path:
+    return CACHE_DIR / f"{ident.replace(':', '_')}.parquet"
+
+def load_cached(ident: str) -> pd.Series:
+    """Load a previously fetched series from the disk cache."""
+    path = cache_path(ident)
+    if not path.exists():
+        return pd.Series(dtype=float)
+    try:
+        return pd.read_parquet(path).iloc[:,0]
+    except Exception as e:
+        warnings.warn(f"Cache read failed for {ident}: {e}")
+        return pd.Series(dtype=float)
+
+def cache_age(ident: str) -> timedelta:
+    """Time since the cached copy of a series was last written."""
+    try:
+        mtime = cache_path(ident).stat().st_mtime
+    except OSError:
+        return timedelta.max
+    return datetime.now() - datetime.fromtimestamp(mtime)
+
+def save_cached(ident: str, s: pd.Series) -> None:
+    """Write a series to the disk cache (atomically, so readers never see a partial file)."""
+    path = cache_path(ident)
+    tmp = path.with_suffix(".tmp")
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        s.to_frame(name="value").to_parquet(tmp, compression="zstd")
+        os.replace(tmp, path)
+    except Exception as e:
+        warnings.warn(f"Cache write failed for {ident}: {e}")
+
+def fetch_window(ident: str, cached: pd.Series, start: datetime, refresh: bool = False) -> Optional[Tuple[datetime, bool]]:
+    """Decide what to download for a series given its cached copy.
+
+    Returns None when the cache is fresh enough to use without any request,
+    otherwise (fetch_start, incremental). Incremental fetches cover only the
+    recent tail and must be merged into the cache with merge_tail.
+    """
+    age = cache_age(ident)
+    if not refresh and not cached.empty and age < CACHE_TTL:
+        return None
+    incremental = not refresh and not cached.empty and age < CACHE_MAX_AGE
+    fetch_start = max(start, cached.index[-1] - CACHE_OVERLAP) if incremental else start
+    return fetch_start, incremental
+
+def merge_tail(cached: pd.Series, tail: pd.Series) -> pd.Series:
+    """Splice a freshly fetched tail onto the cached series (new values win on overlap)."""
+    s = pd.concat([cached, tail])
+    return s[~s.index.duplicated(keep="last")].sort_index()
+
+def downsample(x, y, n_out):
+    """Thin a line to about n_out points, keeping each bucket's min and max.
+
+    Peaks and troughs survive, so the chart looks the same and the min/max
+    markers still sit on the line.
+    """
+    n = len(y)
+    if n <= n_out:
+        return x, y
+    bucket = -(-n // (n_out // 2))  # ceil division
+    n_buckets = -(-n // bucket)
+    padded = np.pad(y, (0, n_buckets * bucket - n), mode="edge").reshape(n_buckets, bucket)
+    offsets = np.arange(n_buckets) * bucket
+    keep = np.concatenate(([0, n - 1], offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1)))
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
@@ -1,15 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import hashlib
+import os
 import warnings
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use("Agg")  # headless: pages only go to PdfPages, so skip GUI backend probing
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib import gridspec
 from pandas_datareader import data as web
+from pypdf import PdfReader, PdfWriter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import macro_common
+from macro_common import CACHE_DIR, FRED_CSV_URL, downsample, fetch_window, load_cached, merge_tail, save_cached
 
 # ---------- Config ----------
 END = datetime.now()
@@ -17,14 +34,33 @@ START = datetime(2018, 1, 1)
 
 OUT_PDF = "macro_monitor.pdf"
 OUT_XLSX = "macro_tracker.xlsx"
+MAX_FETCH_WORKERS = 8  # concurrent downloads (network-bound, so threads are fine)
+FETCH_TIMEOUT = 30  # seconds per request
+
+
+# One keep-alive session shared by every download thread (requests already asks for gzip)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=MAX_FETCH_WORKERS,
+    pool_maxsize=MAX_FETCH_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+))
+
+CHART_POINTS = 1500  # max vertices per plotted line; more is invisible at page size
+
+PAGE_CACHE_DIR = CACHE_DIR / "pages"  # rendered section pages, reused while their inputs are unchanged
+
+# Return horizons: YTD plus fixed look-backs from each series' last observation
+HORIZON_KEYS = ("YTD", "1M", "3M", "1Y", "3Y", "5Y")
+HORIZON_OFFSETS = np.array([30, 90, 365, 3*365, 5*365], dtype="timedelta64[D]").astype("timedelta64[ns]")
 
 # Treat these as point changes (not percent)
-YIELD_OR_SPREAD = {
+YIELD_OR_SPREAD = frozenset({
     "DFF","FEDFUNDS","TB3MS","DGS3MO","DGS2","DGS5","DGS10","DGS30",
     "GS2","GS5","GS10","GS30",
     "AAA","BAA","BAMLH0A0HYM2","BAMLC0A0CMEY","BAMLC0A4CBBBEY",
     "MORTGAGE30US"
-}
+})
 
 # Using FRED and Stooq which are more reliable
 SECTIONS: Tuple[Tuple[str, Dict[str,str]], ...] = (
@@ -74,109 +110,132 @@ SECTIONS: Tuple[Tuple[str, Dict[str,str]], ...] = (
     }),
 )
 
+# Per-identifier diff-mode flag, looked up instead of re-parsing idents while drawing
+IS_DIFF = {ident: ident.split(":", 1)[1] in YIELD_OR_SPREAD for _, items in SECTIONS for ident in items}
+
 # ---------- Helpers ----------
 
-def fetch_series(ident: str, start=START, end=END) -> pd.Series:
-    """Fetch a single series from FRED or Stooq."""
-    src, code = ident.split(":", 1)
-    try:
-        if src == "FRED":
-            df = web.DataReader(code, "fred", start, end)
-            s = df.iloc[:,0]
-        elif src == "STQ":
-            df = web.DataReader(code, "stooq", start, end)
-            s = df["Close"].sort_index()
-        else:
-            return pd.Series(dtype=float)
-        
-        # Clean and filter data
-        s = s.loc[(s.index >= start) & (s.index <= end)].dropna()
-        if not s.empty:
-            s = s.ffill()  # Forward fill missing values
-        return s
-    except Exception as e:
-        warnings.warn(f"Fetch failed for {ident}: {e}")
-        return pd.Series(dtype=float)
+def section_key(title: str, items: Dict[str,str], data_map: Dict[str,pd.Series]) -> str:
+    """Fingerprint of everything a section page is drawn from: the drawing code, the layout and the data."""
+    h = hashlib.sha256(Path(__file__).read_bytes())
+    h.update(Path(macro_common.__file__).read_bytes())  # downsample() lives there
+    h.update(repr((title, items)).encode())
+    for ident in items:
+        h.update(pd.util.hash_pandas_object(data_map[ident]).to_numpy().tobytes())
+    return h.hexdigest()
 
-def pct_return(a, b):
-    """Calculate percentage return."""
+def load_page(key: str) -> Optional[Tuple[pd.DataFrame, bytes]]:
+    """Load a previously rendered section (summary table and PDF page), if present."""
     try:
-        if pd.isna(a) or pd.isna(b) or b == 0:
-            return np.nan
-        return (a/b - 1.0) * 100.0
-    except:
-        return np.nan
-
-def diff_return(a, b):
-    """Calculate difference return (for yields/spreads)."""
+        tab = pd.read_parquet(PAGE_CACHE_DIR / f"{key}.parquet")
+        return tab, (PAGE_CACHE_DIR / f"{key}.pdf").read_bytes()
+    except Exception:
+        return None
+
+def save_page(key: str, tab: pd.DataFrame, page: bytes) -> None:
+    """Store a rendered section; the page goes last so a readable page implies a complete entry."""
     try:
-        if pd.isna(a) or pd.isna(b):
-            return np.nan
-        return a - b
-    except:
-        return np.nan
+        PAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = PAGE_CACHE_DIR / f"{key}.tmp"
+        tab.to_parquet(tmp)
+        os.replace(tmp, PAGE_CACHE_DIR / f"{key}.parquet")
+        tmp.write_bytes(page)
+        os.replace(tmp, PAGE_CACHE_DIR / f"{key}.pdf")
+    except Exception as e:
+        warnings.warn(f"Page cache write failed for {key}: {e}")
+
+def fetch_series(ident: str, start=START, end=END, refresh=False) -> pd.Series:
+    """Fetch a single series from FRED or Stooq, downloading only what the disk cache is missing.
+
+    With refresh=True the full history is re-downloaded and the cache rewritten.
+    """
+    src, code = ident.split(":", 1)
+    cached = load_cached(ident)
+    window = fetch_window(ident, cached, start, refresh)
+    
+    if window is None:
+        s = cached  # written moments ago (e.g. by generate_html.py), skip the network
+    else:
+        fetch_start, incremental = window
+        try:
+            if src == "FRED":
+                resp = SESSION.get(FRED_CSV_URL.format(code=code, start=fetch_start, end=end), timeout=FETCH_TIMEOUT)
+                resp.raise_for_status()
+                df = pd.read_csv(StringIO(resp.text), index_col=0, parse_dates=True, na_values=".")
+                s = df.iloc[:,0]
+            elif src == "STQ":
+                df = web.DataReader(code, "stooq", fetch_start, end, session=SESSION)
+                s = df["Close"]
+                if not s.index.is_monotonic_increasing:  # pandas_datareader returns Stooq newest-first
+                    s = s.sort_index()
+            else:
+                return pd.Series(dtype=float)
+            
+            s = s.dropna()
+            if incremental:
+                s = merge_tail(cached, s)
+            if not s.empty:
+                save_cached(ident, s)
+        except Exception as e:
+            warnings.warn(f"Fetch failed for {ident}: {e}")
+            s = cached  # fall back to stale data rather than nothing
+    
+    # Already NaN-free (dropped before caching); just trim to the requested window
+    return s.loc[start:end]
 
 def compute_returns(s: pd.Series, end_date: datetime, diff_mode: bool) -> dict:
     """Compute returns for various time periods."""
-    horizons = {
-        "YTD": datetime(end_date.year, 1, 1),
-        "1M": end_date - timedelta(days=30),
-        "3M": end_date - timedelta(days=90),
-        "1Y": end_date - timedelta(days=365),
-        "3Y": end_date - timedelta(days=3*365),
-        "5Y": end_date - timedelta(days=5*365),
-    }
+    if s.empty:
+        return dict.fromkeys(HORIZON_KEYS, np.nan)
+    
+    # Last observation on or before each horizon: one binary search for all of them
+    end = np.datetime64(end_date, "ns")
+    ytd = end.astype("datetime64[Y]").astype("datetime64[ns]")
+    targets = np.concatenate(([ytd], end - HORIZON_OFFSETS))
+    positions = s.index.searchsorted(targets, side="right") - 1
+    values = s.to_numpy(dtype=float)
+    s0 = np.where(positions >= 0, values[positions], np.nan)
+    s1 = values[-1]
     
-    out = {}
-    for k, t0 in horizons.items():
-        mask = s.index <= t0
-        if mask.any():
-            s0 = s.loc[mask].iloc[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if diff_mode:
+            result = s1 - s0
         else:
-            s0 = np.nan
-        
-        s1 = s.iloc[-1] if not s.empty else np.nan
-        out[k] = diff_return(s1, s0) if diff_mode else pct_return(s1, s0)
+            result = np.where(s0 == 0, np.nan, (s1 / s0 - 1.0) * 100.0)
     
-    return out
-
-def normalized_100(s: pd.Series) -> pd.Series:
-    """Normalize series to 100 at start."""
-    if s.empty: 
-        return s
-    base = s.iloc[0]
-    if base == 0 or pd.isna(base):
-        return pd.Series(index=s.index, dtype=float)
-    return (s / base) * 100.0
-
-def draw_section(pdf, title: str, items: Dict[str,str], data_map: Dict[str,pd.Series]) -> pd.DataFrame:
-    """Render a section page."""
-    # Build summary table
-    rows = []
-    for ident, name in items.items():
+    return dict(zip(HORIZON_KEYS, result.tolist()))
+
+def normalized_100(values: np.ndarray) -> np.ndarray:
+    """Normalize values to 100 at start (all NaN if the start is 0 or missing)."""
+    base = values[0] if len(values) else np.nan
+    if base == 0 or np.isnan(base):
+        return np.full_like(values, np.nan)
+    return values / base * 100.0
+
+def draw_section(pdf, fig, title: str, items: Dict[str,str], data_map: Dict[str,pd.Series]) -> pd.DataFrame:
+    """Render a section page onto the shared figure."""
+    # Build summary table column-wise: names plus one float64 block (NaN = no data)
+    cols = ["Series", "Current", "YTD", "1M", "3M", "1Y", "3Y", "5Y"]
+    names = list(items.values())
+    values = np.full((len(items), len(cols) - 1), np.nan)
+    for i, ident in enumerate(items):
         s = data_map.get(ident, pd.Series(dtype=float))
         if s.empty:
-            rows.append((name, np.nan, *[np.nan]*6))
             continue
         
-        # Check if this should use diff mode (for yields/spreads)
-        code = ident.split(":")[1]
-        diff_mode = code in YIELD_OR_SPREAD
-        
-        end_date = s.index[-1] if not s.empty else datetime.now()
-        ret = compute_returns(s, end_date, diff_mode)
-        current_val = s.iloc[-1] if not s.empty else np.nan
-        
-        rows.append((name, current_val, ret["YTD"], ret["1M"], ret["3M"], 
-                    ret["1Y"], ret["3Y"], ret["5Y"]))
+        # Yields/spreads use point changes instead of percent returns
+        ret = compute_returns(s, s.index[-1], IS_DIFF[ident])
+        values[i, 0] = s.iloc[-1]
+        values[i, 1:] = [ret[k] for k in cols[2:]]
 
-    cols = ["Series", "Current", "YTD", "1M", "3M", "1Y", "3Y", "5Y"]
-    tab = pd.DataFrame(rows, columns=cols)
+    tab = pd.DataFrame(values, columns=cols[1:])
+    tab.insert(0, "Series", names)
 
     # Create figure
     n = len(items)
     fig_height = max(11, 6 + n * 2.5)
-    fig = plt.figure(figsize=(11, fig_height), dpi=100)
+    fig.clear()
+    fig.set_size_inches(11, fig_height)
     
     # Title
     fig.suptitle(title, x=0.5, y=0.98, ha="center", va="top", fontsize=14, fontweight="bold")
@@ -191,13 +250,9 @@ def draw_section(pdf, title: str, items: Dict[str,str], data_map: Dict[str,pd.Se
     ax_table = fig.add_axes([0.05, table_top - table_height, 0.9, table_height])
     ax_table.axis("off")
     
-    # Format table data
-    safe = tab.copy()
-    for c in safe.columns[1:]:
-        safe[c] = pd.to_numeric(safe[c], errors="coerce")
-        safe[c] = safe[c].round(2)
-    
-    cellText = safe.fillna("").astype(str).values
+    # Format table data: round the numeric block once, blank out missing values
+    rounded = np.round(values, 2).tolist()
+    cellText = [[name, *("" if v != v else str(v) for v in row)] for name, row in zip(names, rounded)]
     
     # Create table
     table = ax_table.table(
@@ -221,7 +276,8 @@ def draw_section(pdf, title: str, items: Dict[str,str], data_map: Dict[str,pd.Se
         
         # Two charts side by side
         ax1 = fig.add_axes([0.08, y_pos + chart_height * 0.55, 0.42, chart_height * 0.35])
-        ax2 = fig.add_axes([0.55, y_pos + chart_height * 0.55, 0.42, chart_height * 0.35])
+        # Right chart stops at 0.95 so its latest-value label stays on the page
+        ax2 = fig.add_axes([0.55, y_pos + chart_height * 0.55, 0.40, chart_height * 0.35])
 
         if s.empty:
             ax1.text(0.5, 0.5, f"{name}: no data", ha="center", va="center", fontsize=9)
@@ -229,81 +285,96 @@ def draw_section(pdf, title: str, items: Dict[str,str], data_map: Dict[str,pd.Se
             ax2.axis("off")
             continue
 
+        # Plain arrays for plotting; both charts share the x values and limits
+        x, y = s.index.to_numpy(), s.to_numpy(dtype=float)
+        xlim = (x[0], x[-1])  # index is sorted, so the ends are the extremes
+
         # Normalized chart (left)
-        s_norm = normalized_100(s)
-        if not s_norm.empty and not s_norm.isna().all():
-            ax1.plot(s_norm.index, s_norm.values, linewidth=0.8, color='#1f77b4')
+        y_norm = normalized_100(y)
+        if not np.isnan(y_norm).all():
+            ax1.plot(*downsample(x, y_norm, CHART_POINTS), linewidth=0.8, color='#1f77b4')
             ax1.set_title(f"{name} - Normalized (2018=100)", fontsize=8, pad=3)
             ax1.grid(True, alpha=0.25, linewidth=0.5)
             ax1.tick_params(labelsize=7)
-            ax1.set_xlim(s_norm.index.min(), s_norm.index.max())
+            ax1.set_xlim(*xlim)
             
             # Add min/max markers
-            if len(s_norm) > 0:
-                max_idx = s_norm.idxmax()
-                min_idx = s_norm.idxmin()
-                ax1.plot(max_idx, s_norm[max_idx], 'g^', markersize=4)
-                ax1.plot(min_idx, s_norm[min_idx], 'rv', markersize=4)
+            i_max, i_min = np.nanargmax(y_norm), np.nanargmin(y_norm)
+            ax1.plot(x[i_max], y_norm[i_max], 'g^', markersize=4)
+            ax1.plot(x[i_min], y_norm[i_min], 'rv', markersize=4)
 
         # Level chart (right)
-        if not s.empty and not s.isna().all():
-            ax2.plot(s.index, s.values, linewidth=0.8, color='#ff7f0e')
-            code = ident.split(':')[1]
-            is_yield = code in YIELD_OR_SPREAD
+        if not np.isnan(y).all():
+            ax2.plot(*downsample(x, y, CHART_POINTS), linewidth=0.8, color='#ff7f0e')
+            is_yield = IS_DIFF[ident]
             ax2.set_title(f"{name} - {'Yield (%)' if is_yield else 'Level'}", fontsize=8, pad=3)
             ax2.grid(True, alpha=0.25, linewidth=0.5)
             ax2.tick_params(labelsize=7)
-            ax2.set_xlim(s.index.min(), s.index.max())
+            ax2.set_xlim(*xlim)
             
             # Add latest value annotation
-            if len(s) > 0:
-                latest_val = s.iloc[-1]
-                latest_date = s.index[-1]
-                ax2.annotate(f'{latest_val:.2f}', 
-                           xy=(latest_date, latest_val),
-                           xytext=(5, 5), 
-                           textcoords='offset points',
-                           fontsize=6,
-                           bbox=dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.3))
-
-    # Add timestamp and data note
-    fig.text(0.99, 0.01, f"Data as of: {END.strftime('%Y-%m-%d %H:%M')}", 
-             ha='right', va='bottom', fontsize=8, style='italic')
+            ax2.annotate(f'{y[-1]:.2f}', 
+                       xy=(x[-1], y[-1]),
+                       xytext=(5, 5), 
+                       textcoords='offset points',
+                       fontsize=6,
+                       bbox=dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.3))
+
+    # Data note (the run timestamp is stamped on at merge time, so cached pages stay current)
     fig.text(0.01, 0.01, "Note: FRED data may have 1-2 day lag", 
              ha='left', va='bottom', fontsize=7, style='italic', color='gray')
 
-    pdf.savefig(fig, bbox_inches="tight")
-    plt.close(fig)
+    pdf.savefig(fig)
     return tab
 
-def main():
+def timestamp_overlay(width: float, height: float):
+    """A transparent page of the given size (in points) carrying only the "Data as of" footer."""
+    fig = Figure(figsize=(width / 72, height / 72), dpi=72)
+    FigureCanvasAgg(fig)
+    fig.text(0.99, 0.01, f"Data as of: {END.strftime('%Y-%m-%d %H:%M')}", 
+             ha='right', va='bottom', fontsize=8, style='italic')
+    buffer = BytesIO()
+    fig.savefig(buffer, format="pdf", transparent=True)
+    return PdfReader(buffer).pages[0]
+
+def render_section(title: str, items: Dict[str,str], data_map: Dict[str,pd.Series]) -> Tuple[pd.DataFrame, bytes]:
+    """Render one section as a standalone PDF page (runs in a worker process)."""
     from matplotlib.backends.backend_pdf import PdfPages
     
+    # Plain Figure outside pyplot: no figure manager, nothing to close afterwards
+    fig = Figure(dpi=72)
+    FigureCanvasAgg(fig)
+    buffer = BytesIO()
+    with PdfPages(buffer) as pdf:
+        tab = draw_section(pdf, fig, title, items, data_map)
+    return tab, buffer.getvalue()
+
+def main(refresh=False):
     print(f"Macro Monitor Report Generator")
     print(f"=" * 60)
     print(f"Fetching data from {START.strftime('%Y-%m-%d')} to {END.strftime('%Y-%m-%d')}")
     print(f"Using FRED (economic data) and Stooq (ETF prices)")
     print(f"-" * 60)
 
-    # Fetch all data
-    data = {}
+    # Fetch all data (each identifier once, downloads overlapped in a thread pool)
+    idents = list(dict.fromkeys(ident for _, items in SECTIONS for ident in items))
+    with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+        data = dict(zip(idents, executor.map(partial(fetch_series, refresh=refresh), idents)))
+    
     success_count = 0
     fail_count = 0
     
-    for section, items in SECTIONS:
-        for ident in items.keys():
-            if ident not in data:
-                print(f"  {ident:<20}", end=" ")
-                data[ident] = fetch_series(ident)
-                if not data[ident].empty:
-                    last_date = data[ident].index[-1]
-                    last_value = data[ident].iloc[-1]
-                    days_old = (END - last_date).days
-                    print(f"✓ {last_value:>10.2f} ({days_old}d old)")
-                    success_count += 1
-                else:
-                    print(f"✗ Failed")
-                    fail_count += 1
+    for ident, s in data.items():
+        print(f"  {ident:<20}", end=" ")
+        if not s.empty:
+            last_date = s.index[-1]
+            last_value = s.iloc[-1]
+            days_old = (END - last_date).days
+            print(f"✓ {last_value:>10.2f} ({days_old}d old)")
+            success_count += 1
+        else:
+            print(f"✗ Failed")
+            fail_count += 1
 
     print(f"-" * 60)
     print(f"Results: {success_count} successful, {fail_count} failed")
@@ -312,31 +383,60 @@ def main():
         print("ERROR: No data fetched. Check internet connection.")
         return
 
-    # Generate PDF
+    # Generate PDF: sections are independent pages. Reuse cached pages whose inputs
+    # are unchanged, render the rest in parallel worker processes, stitch in order
     print(f"\nGenerating PDF report...")
+    titles = [section for section, _ in SECTIONS]
+    sections = [items for _, items in SECTIONS]
+    data_maps = [{ident: data[ident] for ident in items} for items in sections]
+    keys = [section_key(*args) for args in zip(titles, sections, data_maps)]
+    rendered = [load_page(key) for key in keys]
+    todo = [i for i, r in enumerate(rendered) if r is None]
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1)) as executor:
+            fresh = executor.map(render_section, *([args[i] for i in todo] for args in (titles, sections, data_maps)))
+            for i, result in zip(todo, fresh):
+                rendered[i] = result
+                save_page(keys[i], *result)
+    
+    # Drop pages no current section refers to, so the cache doesn't grow without bound
+    for path in PAGE_CACHE_DIR.glob("*.*"):
+        if path.name.split(".", 1)[0] not in keys:
+            path.unlink(missing_ok=True)
+    
     tables = []
-    with PdfPages(OUT_PDF) as pdf:
-        for section, items in SECTIONS:
-            print(f"  Creating section: {section}")
-            tables.append((section, draw_section(pdf, section, items, data)))
+    writer = PdfWriter()
+    for i, (section, (tab, page)) in enumerate(zip(titles, rendered)):
+        print(f"  {'Reused' if i not in todo else 'Created'} section: {section}")
+        tables.append((section, tab))
+        writer.append(BytesIO(page))
+        added = writer.pages[-1]
+        added.merge_page(timestamp_overlay(float(added.mediabox.width), float(added.mediabox.height)))
+    with open(OUT_PDF, "wb") as f:
+        writer.write(f)
 
     # Generate Excel
     print(f"\nGenerating Excel workbook...")
-    with pd.ExcelWriter(OUT_XLSX, engine="openpyxl") as writer:
+    with pd.ExcelWriter(OUT_XLSX, engine="xlsxwriter") as writer:
         # Summary sheets
         for section, tab in tables:
             sheet_name = section[:31]
             tab.to_excel(writer, sheet_name=sheet_name, index=False)
             print(f"  Added sheet: {sheet_name}")
         
-        # Raw data sheets
+        # Raw data sheets: write the two columns straight through xlsxwriter
+        # (same layout as to_excel, without building a DataFrame per series)
         print(f"\nAdding raw data sheets...")
+        book = writer.book
+        date_fmt = book.add_format({"num_format": "YYYY-MM-DD HH:MM:SS"})
         for ident, s in data.items():
             if s.empty: 
                 continue
             sheet_name = ident.replace(":", "_")[:31]
-            df = s.to_frame(name=ident)
-            df.to_excel(writer, sheet_name=sheet_name)
+            ws = book.add_worksheet(sheet_name)
+            ws.write_row(0, 0, [s.index.name or "", ident])
+            ws.write_column(1, 0, s.index.to_pydatetime(), date_fmt)
+            ws.write_column(1, 1, s.to_numpy(dtype=float).tolist())
 
     print(f"\n" + "=" * 60)
     print(f"✅ Report generated successfully!")
@@ -345,5 +445,10 @@ def main():
     print(f"📅 Data through: {END.strftime('%Y-%m-%d %H:%M')}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the macro monitor PDF and Excel workbook.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore the series cache and re-download full histories")
+    args = parser.parse_args()
+    
     warnings.filterwarnings("ignore")
-    main()
+    main(refresh=args.refresh)